@@ -9,24 +9,25 @@ Copyright (C) 2019  Jake "Poikilos" Gustafson
 '''
 import sys
 import os
-import copy
-import shutil
 import json
-import decimal
-import inspect
 import math
+import itertools
+import bisect
 
 from decimal import Decimal
+from types import MappingProxyType
 
 CLI_HELP = '''
 
 Usage
 (where command is TemperatureConfiguration.pyw or
 TemperatureConfigurationCLI.py):
-command [filename] [<temperature1> <temperature2>] [optional arguments]
+command [filename ...] [<temperature1> <temperature2>] [optional arguments]
 
 Sequential arguments:
-filename -- Provide a path to a gcode file.
+filename -- Provide a path to a gcode file. The command line version
+    can take more than one filename followed by temperatures, and then
+    it processes the files in parallel.
 temperatures -- Provide a minimum and maximum temperature. You must
     provide 0 or 2 temperatures, otherwise a ValueError will occur in
     main(). If you provide filename, temperatures must come after
@@ -34,6 +35,7 @@ temperatures -- Provide a minimum and maximum temperature. You must
 
 Optional arguments:
 --verbose -- Set whether to show additional messages.
+--help, -h -- Show the documentation and settings then exit.
 '''
 
 '''
@@ -98,7 +100,9 @@ def echo2(*args, **kwargs):
 def usage():
     # print(CLI_HELP)
     print(GCodeFollower.getDocumentation())
-    GCodeFollower.printSettingsDocumentation()
+    lines = []
+    GCodeFollower.printSettingsDocumentation(print_callback=lines.append)
+    echo0("\n".join(lines))
     print("")
 
 
@@ -110,8 +114,9 @@ def show_fewest(n):
     n -- a float/Decimal value.
     '''
     s = "{}".format(n)
-    while s.endswith(".0") or s.endswith("0"):
-        s = s[:-1]
+    if "." in s:
+        s = s.rstrip("0").rstrip(".")
+        # ^ only zeros after the point (100 stays 100)
     return s
 
 
@@ -144,7 +149,9 @@ def round_nearest_d(*args):
         multiplier = Decimal(10 ** precision)
         x = args[0]
         if isinstance(x, float):
-            x = Decimal(x)
+            x = Decimal(repr(x))
+            # ^ Not Decimal(x): that keeps the binary error (Decimal(2.675)
+            #   is 2.67499999...), which would round the wrong way.
         if not isinstance(x, Decimal):
             raise TypeError("The value must be a float or Decimal.")
         increased = Decimal(x * multiplier)
@@ -205,6 +212,20 @@ def round_nearest(*args):
 
 round = round_nearest
 
+FIXED_POINT_SCALE = 1000000
+# ^ Distances (mm) are compared as integers in this many units per mm
+#   (See to_fixed).
+
+
+def to_fixed(mm):
+    '''
+    Convert a distance in mm (float, Decimal or int) to an integer in
+    FIXED_POINT_SCALE units so that threshold comparisons are exact
+    (a float difference such as 2.2 - 1.0 is 1.2000000000000002, which
+    would otherwise exceed a 1.2 threshold).
+    '''
+    return int(python_round(mm * FIXED_POINT_SCALE))
+
 
 def getHMSFromS(estSec):
     estLeft = estSec
@@ -294,71 +315,43 @@ def changed_cmd(cmd, key, value, precision=5):
     return meta_to_cmd(meta)
 
 
-def get_cmd_meta(cmd):
+def get_cmd_meta(cmd, warn=True):
     '''
     Parse the g-code command to a set of lists such as:
     [['G', '1'], ['X', '110'], ['E', '45'], ['F', '500.0']]
     [['M', '117'], ['', 'Some message']]
+
+    Keyword arguments:
+    warn -- Show a warning for each value that is not a number (Set
+        this to False if the caller converts the values anyway).
     '''
-    comment_i = None
-    '''
-    commentMarks = [";", "//"]
-    for commentMark in commentMarks:
-      tryI = cmd.find(commentMark)
-      if tryI >= 0:
-          if (comment_i is None) or (tryI < comment_i):
-              comment_i = tryI
-    '''
-    tryI = cmd.find(";")
-    if tryI >= 0:
-        # if (comment_i is None) or (tryI < comment_i):
-        comment_i = tryI
-    if cmd.strip().startswith("/"):
+    if (len(cmd) < 1) or (cmd[0] == ";"):
+        return None  # a blank or comment line (skip the scanning below)
+    cmd = cmd.partition(";")[0].strip()
+    if cmd.startswith("/"):
         # ^ as per <https://www.cnccookbook.com/
         #   g-code-basics-program-format-structure-blocks/>
         # (also takes care of non-standard // comments)
-        comment_i = cmd.find("/")
-    if comment_i is not None:
-        cmd = cmd[0:comment_i]
-
-    cmd = cmd.strip()
-    # print("cmd={}".format(cmd))
-    if len(cmd) < 1:
         return None
-    if cmd[0] == ";":
-        # comment
+    if len(cmd) < 1:
         return None
-    while "\t" in cmd:
-        cmd = cmd.replace("\t", " ")
-    while "  " in cmd:
-        cmd = cmd.replace("  ", " ")
-    parts = cmd.split(" ")
-    cmd_meta = []
-    functionStr = None
-    for i in range(len(parts)):
-        arg = parts[i].strip()
-        if functionStr is None:
-            if len(arg) < 1:
-                functionStr = ""
-            else:
-                functionStr = arg
-        if len(arg) > 1:
-            k, v = arg[0], arg[1:]
-            if functionStr == "M117":
-                displayStr = " ".join(parts[1:])
-                cmd_meta.append([k, v])
-                cmd_meta.append(['', displayStr])
-                # ^ See M117 in docstring
-                break
+    parts = cmd.split()
+    # ^ split with no separator also collapses runs of tabs and spaces.
+    if parts[0] == "M117":
+        # See M117 in docstring
+        return [[parts[0][0], parts[0][1:]], ['', " ".join(parts[1:])]]
+    cmd_meta = [[arg[0], arg[1:]] if len(arg) > 1 else [arg]
+                for arg in parts]
+    # ^ no value (such as: To home X, nothing is after 'G1 X') is [arg]
+    if warn:
+        for part in cmd_meta:
+            if len(part) < 2:
+                continue
             try:
-                fv = float(v)
-            except ValueError as ex:
+                float(part[1])
+            except ValueError:
                 echo0('WARNING: "{}" is not a number in "{}"'
-                      ''.format(v, cmd))
-            cmd_meta.append([k, v])
-        else:
-            # no value (such as: To home X, nothing is after 'G1 X'):
-            cmd_meta.append([arg[0]])
+                      ''.format(part[1], " ".join(parts)))
     return cmd_meta
 
 
@@ -372,15 +365,17 @@ def cmd_meta_dict(cmd_meta):
     if cmd_meta is None:
         return None
     metaD = {}
+    if cmd_meta:
+        # Only the first pair names the function.
+        pair = cmd_meta[0]
+        if len(pair) != 2:
+            echo0("WARNING: The G-code command doesn't have"
+                  " 2 parts: {} in {}"
+                  "".format(pair, cmd_meta))
+            metaD['function'] = ''
+        else:
+            metaD['function'] = pair[0] + pair[1]
     for pair in cmd_meta:
-        if metaD.get('function') is None:
-            if len(pair) != 2:
-                echo0("WARNING: The G-code command doesn't have"
-                      " 2 parts: {} in {}"
-                      "".format(pair, cmd_meta))
-                metaD['function'] = ''  # prevent gathering it again
-            else:
-                metaD['function'] = ''.join(pair)
         if len(pair) == 2:
             k, v = pair
         elif len(pair) == 1:
@@ -391,22 +386,48 @@ def cmd_meta_dict(cmd_meta):
     return metaD
 
 
+_CASTERS = {
+    "int": int,
+    "Decimal": Decimal,
+    "float": float,
+    "bool": bool,
+}
+# ^ Settings types (type(var).__name__) and how to cast to each.
+
+
 def cast_by_type_string(value, type_str):
     if value is None:
         return None
     elif value == "":
         return None
     # NOTE: to reverse this, you'd have to use type(var).__name__
-    if type_str == "int":
-        return int(value)
-    elif type_str == "Decimal":
-        return Decimal(value)
-    elif type_str == "float":
-        return float(value)
-    elif type_str == "bool":
-        return bool(value)
-    else:
+    caster = _CASTERS.get(type_str)
+    if caster is None:
         return value
+    return caster(value)
+
+
+class _DecimalEncoder(json.JSONEncoder):
+    """
+    Write each Decimal as a string so settings.json keeps the exact
+    value (see cast_by_type_string for the reverse).
+    """
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return str(o)
+        return json.JSONEncoder.default(self, o)
+
+
+def _list_var_names(names):
+    '''
+    Group the element names of list settings by base name, such as
+    {"special_heights": ("special_heights[0]",)}, in the given order.
+    '''
+    groups = {}
+    for name in names:
+        if name.endswith("]"):
+            groups.setdefault(name[:name.index("[")], []).append(name)
+    return {k: tuple(v) for k, v in groups.items()}
 
 
 class GCodeFollowerArgParser():
@@ -424,15 +445,14 @@ class GCodeFollowerArgParser():
         self.verbose = False if verbosity < 1 else True
         self.temperatures = None
         self.template_gcode_path = None
+        self.template_gcode_paths = []  # all filenames (if more than 1)
         self.help = False
         seqArgs = []
 
-        for argI in range(1, len(sys.argv)):
-            arg = sys.argv[argI]
+        for arg in sys.argv[1:]:
             if arg == "--verbose":
                 self.verbose = True
-                echo0("* Verbose mode is enabled.")
-            elif arg == "--help":
+            elif arg in ("--help", "-h"):
                 self.help = True
             elif arg.startswith("--"):
                 raise ValueError("The argument {} is invalid."
@@ -440,19 +460,21 @@ class GCodeFollowerArgParser():
             else:
                 seqArgs.append(arg)
 
-        if (len(seqArgs) == 1) or (len(seqArgs) == 3):
-            self.template_gcode_path = seqArgs[0]
-        if len(seqArgs) == 3:
-            self.temperatures = [seqArgs[1], seqArgs[2]]
-        elif len(seqArgs) == 2:
-            self.temperatures = [seqArgs[0], seqArgs[1]]
-        if len(seqArgs) > 3:
-            usage()
-            raise ValueError("Error: There were too many arguments.")
+        if len(seqArgs) == 1:
+            self.template_gcode_paths = seqArgs[:1]
+        elif len(seqArgs) >= 3:
+            self.template_gcode_paths = seqArgs[:-2]
+        if len(seqArgs) >= 2:
+            self.temperatures = [seqArgs[-2], seqArgs[-1]]
+        if len(self.template_gcode_paths) > 0:
+            self.template_gcode_path = self.template_gcode_paths[0]
 
         if self.verbose:
+            echo0("* Verbose mode is enabled.")
+            # ^ once, after parsing (even if --verbose is repeated)
             print("seqArgs: {}".format(seqArgs))
-            print("template_gcode_path: {}".format(self.template_gcode_path))
+            print("template_gcode_paths: {}"
+                  "".format(self.template_gcode_paths))
             print("temperatures: {}".format(self.temperatures))
 
 
@@ -495,11 +517,58 @@ class GCodeFollower:
     # some mesh issues.
 
     _end_retraction_flag = "filament slightly"
+    # ^ in the comment of the end gcode's retraction, such as
+    #   "G1 E-1 F2100 ; retract filament slightly"
     _rangeNames = ["min", "max"]
     _settingsDocPath = "settings descriptions.txt"
     _settingsPath = "settings.json"
-    _settings_types = {}
-    _settings_descriptions = {}
+    _writeBatchSize = 65536  # Write this many output lines at once.
+    _gcodeEncoding = "latin-1"
+    # ^ One character per byte: decoding can't fail, non-ASCII bytes in
+    #   comments are written back unchanged, and len(line) is the line's
+    #   size in bytes (for progress).
+    _settingsDefinitions = (
+        # (name, default value, python_type, description)
+        ("template_gcode_path", None, "str",
+         "Look here for the source gcode of the temperature tower."),
+        ("default_path", "tower.gcode", "str",
+         "Look here if template_gcode_path is not specified."),
+        ("level_count", 10, "int",
+         "This is how many levels are in the source gcode file."),
+        ("level_height", "10.0", "Decimal",
+         "The height of each level excluding levels (special_heights"
+         " can override this for individual levels of the tower)."),
+        ("special_heights[0]", "12.8", "Decimal",
+         "This is the height of the first floor and any other floors"
+         " that don't match level_height (must be consecutive)."),
+        ("temperature_step", "5", "int",
+         "Change this many degrees at each level."),
+        ("max_z_build_movement", "1.20", "Decimal",
+         "This Z distance or less is counted as a build movement, and"
+         " is eliminated after the tower is truncated (after there are"
+         " no more temperature steps in the range and the next level"
+         " would start)."),
+        (_rangeNames[0] + "_temperature", None, "int",
+         "The first level of the temperature tower should be printed at"
+         " this temperature (C)."),
+        (_rangeNames[1] + "_temperature", None, "int",
+         "After incrementing each level of the tower by"
+         " temperature_step, finish the level that is this temperature"
+         " then stop printing."),
+    )
+    # ^ The types and descriptions are known before any instance exists
+    #   (so help doesn't need one), and are read-only since every
+    #   instance shares them:
+    _settings_types = MappingProxyType(
+        {d[0]: d[2] for d in _settingsDefinitions}
+    )
+    _settings_descriptions = MappingProxyType(
+        {d[0]: d[3] for d in _settingsDefinitions}
+    )
+    _listVarNames = MappingProxyType(
+        _list_var_names(d[0] for d in _settingsDefinitions)
+    )
+    # ^ Element names of each list setting (see getListVars).
 
     @staticmethod
     def getDocumentation():
@@ -548,40 +617,8 @@ class GCodeFollower:
         self._settings = {}
 
         self.stats = {}
-        self._createVar("template_gcode_path", None, "str",
-                        "Look here for the source gcode of the"
-                        " temperature tower.")
-        self._createVar("default_path", "tower.gcode", "str",
-                        "Look here if template_gcode_path is not"
-                        " specified.")
-        self._createVar("level_count", 10, "int",
-                        "This is how many levels are in the source"
-                        " gcode file.")
-        self._createVar("level_height", "10.0", "Decimal",
-                        "The height of each level excluding levels"
-                        " (special_heights can override this for"
-                        " individual levels of the tower).")
-        self._createVar("special_heights[0]", "12.8", "Decimal",
-                        "This is the height of the first floor and any"
-                        " other floors that don't match level_height"
-                        " (must be consecutive).")
-        self._createVar("temperature_step", "5", "int",
-                        "Change this many degrees at each level.")
-        self._createVar("max_z_build_movement", "1.20", "Decimal",
-                        "This Z distance or less is counted as a build"
-                        " movement, and is eliminated after the tower"
-                        " is truncated (after there are no more"
-                        " temperature steps in the range and the next"
-                        " level would start).")
-        self._createVar(self.getRangeVarName("temperature", 0), None,
-                        "int", ("The first level of the temperature"
-                                " tower should be printed at this"
-                                " temperature (C)."))
-        self._createVar(self.getRangeVarName("temperature", 1), None,
-                        "int", ("After incrementing each level of the"
-                                " tower by temperature_step, finish the"
-                                " level that is this temperature then"
-                                " stop printing."))
+        for name, value, python_type, _ in GCodeFollower._settingsDefinitions:
+            self._createVar(name, value, python_type)
         self._stop_building_msg = ("; GCodeFollower says: stop_building"
                                    " (additional build-related codes"
                                    " that were below will be excluded)")
@@ -656,9 +693,11 @@ class GCodeFollower:
 
         self.code_numbers = {}
         for k, v in self.commands.items():
-            self.code_numbers[k] = Decimal(v[1:])
+            self.code_numbers[k] = float(v[1:])
+            # ^ float (not Decimal) since the per-line code_number (int)
+            #   is compared to these (and some have a fraction: G92.1).
 
-        self.debuggedLengths = []
+        self.debuggedLengths = set()
 
     def saveDocumentationOnce(self):
         if not os.path.isfile(GCodeFollower._settingsDocPath):
@@ -786,18 +825,17 @@ class GCodeFollower:
         try:
             with open(GCodeFollower._settingsDocPath, 'w') as outs:
                 self.saveDocumentationTo(outs)
-        except e:
+        except Exception:
             os.remove(GCodeFollower._settingsDocPath)
-            raise e
+            raise
 
     @staticmethod
     def saveDocumentationTo(stream):
-        stream.write(GCodeFollower.getDocumentation() + "\n")
-
-        def _saveLine(line):
-            stream.write(line + "\n")
-        # _saveLine("Writing settings:")
-        GCodeFollower.printSettingsDocumentation(print_callback=_saveLine)
+        lines = [GCodeFollower.getDocumentation()]
+        # lines.append("Writing settings:")
+        GCodeFollower.printSettingsDocumentation(print_callback=lines.append)
+        stream.write("\n".join(lines) + "\n")
+        # ^ one write instead of one per line
 
     @staticmethod
     def printSettingsDocumentation(print_callback=echo0):
@@ -849,7 +887,7 @@ class GCodeFollower:
         self._settings[name] = value
         if self._verbose:
             echo0("  * {} set {} to {}"
-                  "".format(inspect.stack()[1][3], name,
+                  "".format(sys._getframe(1).f_code.co_name, name,
                             self.getVar(name)))
 
     def getRangeVarName(self, name, i):
@@ -876,11 +914,18 @@ class GCodeFollower:
         #         return None
         # return self.castVar(name, self._settings[name])
         result = self._settings.get(name)
-        if prevent_exceptions:
-            if result is None:
-                return None
+        if result is None:
+            if not prevent_exceptions:
+                GCodeFollower._settings_types[name]  # KeyError if bad
+            return None
         # echo0(json.dumps(self._settings))
-        return cast_by_type_string(result, GCodeFollower._settings_types[name])
+        if isinstance(result, str):
+            # Only strings (such as from a GUI field) still need a cast
+            # since setVar, _createVar & loadSettings store other
+            # values as the setting's type already.
+            return cast_by_type_string(result,
+                                       GCodeFollower._settings_types[name])
+        return result
 
     def getRangeVar(self, name, i):
         return self.getVar(self.getRangeVarName(name, i))
@@ -890,25 +935,16 @@ class GCodeFollower:
 
     def getRangeVars(self, name):
         results = []
-        got = True
-        count = 0
-        while True:
-            try:
-                got = self.getVar(self.getRangeVarName(name, count),
-                                  prevent_exceptions=True)
-            except IndexError:
-                # ^ getRangeVarName can still throw an exception
-                got = None
+        for i in range(len(GCodeFollower._rangeNames)):
+            got = self.getVar(self.getRangeVarName(name, i),
+                              prevent_exceptions=True)
             if got is None:
                 break
-            count += 1
             results.append(got)
         return results
 
-    def _createVar(self, name, value, python_type, description):
+    def _createVar(self, name, value, python_type):
         self._settings[name] = cast_by_type_string(value, python_type)
-        GCodeFollower._settings_types[name] = python_type
-        GCodeFollower._settings_descriptions[name] = description
 
     def getListVar(self, name, i, prevent_exceptions=True):
         return self.getVar(name + "[" + str(i) + "]",
@@ -917,6 +953,20 @@ class GCodeFollower:
     def setListVar(self, name, i, value):
         self.setVar(name + "[" + str(i) + "]", value)
 
+    def getListVars(self, name):
+        '''
+        Get the values of a list setting such as special_heights, up to
+        the first one that is None. Each value is still stored under
+        its own "name[i]" setting so settings.json stays compatible.
+        '''
+        results = []
+        for element_name in GCodeFollower._listVarNames.get(name, ()):
+            value = self.getVar(element_name, prevent_exceptions=True)
+            if value is None:
+                break
+            results.append(value)
+        return results
+
     @staticmethod
     def getHelp(name):
         """
@@ -931,34 +981,33 @@ class GCodeFollower:
         return GCodeFollower._settings_types.keys()
 
     def saveSettings(self):
-        serializable_settings = {}
-        for k, v in self._settings.items():
-            if type(v).__name__ == "Decimal":
-                serializable_settings[k] = str(v)
-            else:
-                serializable_settings[k] = v
-        with open(GCodeFollower._settingsPath, 'w') as outs:
-            json.dump(serializable_settings, outs, indent=4)
+        tmp_path = "{}.{}.tmp".format(GCodeFollower._settingsPath,
+                                      os.getpid())
+        # ^ Write a whole file then rename it, so that CLI workers
+        #   saving at the same time can't leave a mix of both.
+        with open(tmp_path, 'w') as outs:
+            outs.write(json.dumps(self._settings, indent=4,
+                                  cls=_DecimalEncoder))
+            # ^ one write (json.dump writes each small piece separately)
             # sort_keys=True)
+        os.replace(tmp_path, GCodeFollower._settingsPath)
 
     def loadSettings(self):
         echo0("Loading settings...")
         self.error = None
         with open(GCodeFollower._settingsPath) as ins:
             tmp_settings = json.load(ins)
-            # Use a temp file in case the file is missing any settings.
-            for k, originalV in tmp_settings.items():
-                v = originalV
-                if k in self._settings:
-                    if v == "None":
-                        v = None
-                    self._settings[k] = self.castVar(k, v)
-                else:
-                    if self.error is None:
-                        self.error = ""
-                    else:
-                        self.error += "; "
-                    self.error += k + " is not a valid setting name."
+        # Use a temp dict in case the file is missing any settings.
+        unknown_names = [k for k in tmp_settings if k not in self._settings]
+        for k in unknown_names:
+            del tmp_settings[k]
+        for k, v in tmp_settings.items():
+            if v == "None":
+                v = None
+            self._settings[k] = self.castVar(k, v)
+        if unknown_names:
+            self.error = "; ".join(k + " is not a valid setting name."
+                                   for k in unknown_names)
         return self.error is None
 
     def echo(self, msg):
@@ -967,18 +1016,17 @@ class GCodeFollower:
     def _echo_progress(self, msg):
         progress = self.getStat("progress")
         if progress is not None:
-            self.echo(progress + "  " + msg)
+            prefix = progress + "  "
+            self.echo(prefix + msg.replace("\n", "\n" + prefix))
+            # ^ on every line of the message (one echo per message)
         else:
             self.echo(msg)
 
     def enableUI(self, enable):
         if enable:
-            print("")
-            print("The process completed.")
-            print("")
+            print("\nThe process completed.\n")
         else:
-            print("")
-            print("Please wait...")
+            print("\nPlease wait...")
 
     def pushLimits(self, value):
         '''
@@ -1085,29 +1133,16 @@ class GCodeFollower:
         # Find these OR the next highest (will differ based on layer
         # height and Slic3r Z offset setting; which may also be
         # negative, but next highest is close enough)
-        special_heights = []
-        i = 0
-        v = self.getListVar("special_heights", i)
-        while v is not None:
-            special_heights.append(v)
-            i += 1
-            v = self.getListVar("special_heights", i)
-
-        i = None
+        special_heights = self.getListVars("special_heights")
+        level_heights = special_heights[:getV("level_count")]
+        level_heights += ([getV("level_height")]
+                          * (getV("level_count") - len(level_heights)))
         # self.heights = [0, 16.4, 30.16, 43.6, 57.04]
-        self.heights = []  # ALWAYS must start with level 0 at 0.00
-        total_height = Decimal("0.000")
-        for i in range(getV("level_count")):
-            this_level_height = getV("level_height")
-            if (special_heights is not None) and (i < len(special_heights)):
-                if special_heights[i] is not None:
-                    # if verbose:
-                    #     print("special_heights[" + str(i) + "]: "
-                    #           + type(special_heights[i]).__name__)
-                    this_level_height = special_heights[i]
-            self.heights.append(total_height)
-            total_height += this_level_height
-        total_height = None
+        self.heights = list(itertools.accumulate(
+            [Decimal("0.000")] + level_heights[:-1]
+        ))[:len(level_heights)]
+        # ^ ALWAYS must start with level 0 at 0.00 (each level starts
+        #   at the sum of the heights of the levels below it).
 
         for i in range(2):
             if verbose:
@@ -1123,10 +1158,6 @@ class GCodeFollower:
         # ^ These are set automatically by self.pushLimits depending
         #   upon how many steps between all levels or how many
         #   temperatures are available (the smallest of the two).
-        height_i = 0
-        # height = Decimal("0.00")
-        self.temperatures = []
-        self.desired_temperatures = []
         self.dirStep = getV("temperature_step") * -1
         if self.dirStep == 0:
             raise ValueError("The step (per floor) should not be 0.")
@@ -1149,45 +1180,30 @@ class GCodeFollower:
         #                      + self.getRangeVarName("temperature", 1)
         #                      + "' is missing (you must set this).")
 
-        prevTemp = None
-        for thisTemp in temps:
-            if (prevTemp is not None) and (thisTemp < prevTemp):
-                # self.dirStep *= 1
-                raise ValueError("The steps must be in order"
-                                 " from lowest to highest.")
-            prevTemp = thisTemp
-        temps = list(reversed(temps))
+        if any(a > b for a, b in zip(temps, temps[1:])):
+            # self.dirStep *= 1
+            raise ValueError("The steps must be in order"
+                             " from lowest to highest.")
+        temps.reverse()  # (getRangeVars returns a new list)
         print("* temperatures (max 1st usually): {}".format(temps))
-        while True:
-            if height_i < len(self.heights):
-                # height = self.heights[height_i]
-                # if verbose:
-                #    print("* adding level {} ({} C) at"
-                #           " {}mm".format(height_i,
-                #                          this_temperature, height))
-                self.temperatures.append(this_temperature)
-                self.pushLimits(this_temperature)
-                # ^ sets min_temperature and max_temperature
-            self.desired_temperatures.append(this_temperature)
-            # if verbose:
-            #     print("temperature_step: "
-            #           + type(getV("temperature_step")).__name__)
-            this_temperature += self.dirStep
-            if (self.dirStep > 0) and (this_temperature > temps[-1]):
-                this_temperature -= self.dirStep
-                break
-            elif (self.dirStep < 0) and (this_temperature < temps[-1]):
-                this_temperature -= self.dirStep
-                break
-            height_i += 1
+        stop = temps[-1] + (1 if self.dirStep > 0 else -1)
+        # ^ include temps[-1] if the steps land on it.
+        self.desired_temperatures = (
+            list(range(this_temperature, stop, self.dirStep))
+            or [this_temperature]
+        )
+        self.temperatures = self.desired_temperatures[:len(self.heights)]
+        for this_temperature in self.temperatures:
+            self.pushLimits(this_temperature)
+            # ^ sets min_temperature and max_temperature
         this_temperature = None
         self.echo("")
-        ls = ["{:<9}".format(i) for i in range(len(self.temperatures))]
-        self.echo("level:       " + "".join(ls))
-        ts = ["{:<9}".format(t) for t in self.temperatures]
-        self.echo("temperature: " + "".join(ts))
-        hs = ["{:>8.3f}mm".format(t) for t in self.heights]
-        self.echo("height:     " + "".join(hs))
+        row_fmt = "{:<9}" * len(self.temperatures)
+        self.echo("level:       "
+                  + row_fmt.format(*range(len(self.temperatures))))
+        self.echo("temperature: " + row_fmt.format(*self.temperatures))
+        self.echo("height:     "
+                  + ("{:>8.3f}mm" * len(self.heights)).format(*self.heights))
         self.echo("")
         if (self.min_temperature > temps[-1]) and (self.dirStep < 0):
             self.echo(
@@ -1236,15 +1252,12 @@ class GCodeFollower:
           operation.
         - ...getStatLine so I can provide accurate error output.
         """
-        if not self.getStat("stop_building"):
-            if name == "E":
-                total_name = "net_" + name + "_before_stop_building"
-                prev_total = self.stats.get(total_name)
-                if prev_total is not None:
-                    self.stats[total_name] += Decimal(value)
-                else:
-                    self.stats[total_name] = Decimal(value)
-        self.stats[name] = value
+        stats = self.stats
+        if (name == "E") and not stats.get("stop_building"):
+            # ^ Check the name first since most stats aren't E.
+            total_name = "net_E_before_stop_building"
+            stats[total_name] = stats.get(total_name, 0.0) + float(value)
+        stats[name] = value
         self.stats_lines[name] = line_number
 
     def getStat(self, name):
@@ -1260,9 +1273,18 @@ class GCodeFollower:
         self.stats = {}  # values known by current OR previous lines
         self.stats_lines = {}  # what line# provides the value of a stat
 
-    def generateTower(self):
+    def generateTower(self, save_settings=True):
+        '''
+        Keyword arguments:
+        save_settings -- Save the settings after checking them (Set
+            this to False if several processes generate at once and the
+            settings were already saved).
+
+        Returns: True if the tower was saved, otherwise False (such as
+        if checkSettings failed).
+        '''
         try:
-            self._generateTower()
+            return self._generateTower(save_settings=save_settings)
         except Exception as ex:
             self.enableUI(True)
             raise ex
@@ -1313,17 +1335,24 @@ class GCodeFollower:
         Analyze the gcode line and add seconds to self._estS based on
         the travel speed and distance.
         '''
-        gcodeLine = gcodeLine.strip()
-        cmd_meta = get_cmd_meta(gcodeLine)
+        self.addSecFromMeta(get_cmd_meta(gcodeLine.strip()))
+
+    def addSecFromMeta(self, cmd_meta):
+        '''
+        This is the same as addSec but uses a line that was already
+        parsed by get_cmd_meta (so the line isn't parsed twice).
+        '''
         meta = cmd_meta_dict(cmd_meta)
         if meta is None:
-            lenMsg = "{}(string[{}])".format(meta, 0)
+            shape = (None, 0)
         else:
-            lenMsg = "{}(string[{}])".format(cmd_meta[0], len(meta))
-        if lenMsg not in self.debuggedLengths:
+            shape = (tuple(cmd_meta[0]), len(meta))
+            # ^ A tuple rather than a formatted message since this runs
+            #   for nearly every line.
+        if shape not in self.debuggedLengths:
             # Show unique command structures (Where the combination
             # of the G-code name and the parameter count is unique).
-            self.debuggedLengths.append(lenMsg)
+            self.debuggedLengths.add(shape)
             debug("* found first instance of a command like: {}"
                   "".format(meta))
         if meta is None:
@@ -1335,251 +1364,235 @@ class GCodeFollower:
             # Choose tool
             # such as {'T': '0'}
             self.setTool(f)
-        elif f == "M104":
-            # Set hotend temperature
-            # such as {'M': '104', 'S': '210'}
-            S = meta.get('S')
-            if S is None:
-                echo0('WARNING: S is None in "{}"'
-                      ''.format(cmd_meta))
-            else:
-                S = float(S)
-                self.setToolTemperature(S)
-        elif f == "M105":
-            # Report temperatures
-            # Usage: M105 [R] [T<index>]
-            # such as {'M': '105'}
-            pass
-        elif f == "M109":
-            # Wait for hotend temperature
-            # Usage:
-            # M109 [B<temp>] [F<flag>] [I<index>] [R<temp>] [S<temp>] [T<index>]
-            # such as {'M': '109', 'S': '210'}
-            S = meta.get('S')
-            if S is None:
-                echo0('WARNING: S is None in "{}"'
-                      ''.format(cmd_meta))
-            else:
-                S = float(S)
-                heatupTime = self.getToolSecRelTemp(S)
-                self._estS += heatupTime
-                oldS = self.getToolTemperature()
-                debug("_estSec += {} tool heatup time from {} to {}"
-                      "".format(heatupTime, oldS, S))
-                self.setToolTemperature(S)
-        elif f == "M82":
-            # Set extrusion to absolute mode
-            # such as {'M': '82'}
-            pass
-        elif f == "M280":
-            # Set a servo position
-            # Usage: M280 P<index> S<pos>
-            # such as {'M': '280', 'P': '0', 'S': '160'}
-            pass
-        elif f == "G4":
-            # Dwell
-            # Usage: G4 [P<time (ms)>] [S<time (sec)>]
-            # such as {'G': '4', 'P': '100'}
-            S = meta.get('S')
-            P = meta.get('P')
+            return
+        try:
+            method = GCodeFollower._secMethods[f]
+        except KeyError:
+            echo0("WARNING: The command isn't emulated for estimates"
+                  " or other uses: {}"
+                  "".format(cmd_meta))
+            return
+        if method is not None:
+            method(self, meta, cmd_meta)
+        # Additional relevant commands:
+        # M209: Set auto retract
+        # M141: Set chamber temperature
+
+    def _addToolTemperatureSec(self, meta, cmd_meta):
+        # Set hotend temperature
+        # such as {'M': '104', 'S': '210'}
+        S = meta.get('S')
+        if S is None:
+            echo0('WARNING: S is None in "{}"'
+                  ''.format(cmd_meta))
+        else:
+            S = float(S)
+            self.setToolTemperature(S)
+
+    def _addToolHeatupSec(self, meta, cmd_meta):
+        # Wait for hotend temperature
+        # Usage:
+        # M109 [B<temp>] [F<flag>] [I<index>] [R<temp>] [S<temp>] [T<index>]
+        # such as {'M': '109', 'S': '210'}
+        S = meta.get('S')
+        if S is None:
+            echo0('WARNING: S is None in "{}"'
+                  ''.format(cmd_meta))
+        else:
+            S = float(S)
+            heatupTime = self.getToolSecRelTemp(S)
+            self._estS += heatupTime
+            oldS = self.getToolTemperature()
+            debug("_estSec += {} tool heatup time from {} to {}"
+                  "".format(heatupTime, oldS, S))
+            self.setToolTemperature(S)
+
+    def _addDwellSec(self, meta, cmd_meta):
+        # Dwell
+        # Usage: G4 [P<time (ms)>] [S<time (sec)>]
+        # such as {'G': '4', 'P': '100'}
+        S = meta.get('S')
+        P = meta.get('P')
+        if P is not None:
+            P = float(P)
+        if S is None:
             if P is not None:
-                P = float(P)
-            if S is None:
-                if P is not None:
-                    S = P / 1000.0
-            else:
-                S = float(S)
-            if S is not None:
-                self._estS += S
-                debug("_estSec += {} dwell".format(S))
-            else:
-                echo0('WARNING: S & P are None in "{}"'
-                      ''.format(cmd_meta))
-        elif f == "M420":
-            # Get and/or set bed leveling state
-            # such as {'M': '420', 'S': '1'}
-            pass
-        elif f == "G28":
-            # Auto-home
-            # such as {'G': '28'}
-            oldTS = self.getToolTemperature()
-            T_S = self.autoHomeToolTemperature
-            toolHeatupTime = self.getToolSecRelTemp(T_S)
-            self._estS += toolHeatupTime
-            debug("_estSec += {} tool heatup time from {} to {} auto"
-                  "".format(toolHeatupTime, oldTS, T_S))
-            self.setToolTemperature(T_S)
-            oldBS = self.getBedTemperature()
-            B_S = self.autoHomeBedTemperature
+                S = P / 1000.0
+        else:
+            S = float(S)
+        if S is not None:
+            self._estS += S
+            debug("_estSec += {} dwell".format(S))
+        else:
+            echo0('WARNING: S & P are None in "{}"'
+                  ''.format(cmd_meta))
+
+    def _addAutoHomeSec(self, meta, cmd_meta):
+        # Auto-home
+        # such as {'G': '28'}
+        oldTS = self.getToolTemperature()
+        T_S = self.autoHomeToolTemperature
+        toolHeatupTime = self.getToolSecRelTemp(T_S)
+        self._estS += toolHeatupTime
+        debug("_estSec += {} tool heatup time from {} to {} auto"
+              "".format(toolHeatupTime, oldTS, T_S))
+        self.setToolTemperature(T_S)
+        oldBS = self.getBedTemperature()
+        B_S = self.autoHomeBedTemperature
+        bedHeatupTime = self.getBedSecRelTemp(B_S)
+        self._estS += bedHeatupTime
+        debug("  _estSec += {} bed heatup time from {} to {} auto"
+              "".format(bedHeatupTime, oldBS, B_S))
+        self.setBedTemperature(B_S)
+        self._estS += self.autoHomeMoveTime
+        debug("  _estSec += {} autoHomeMoveTime"
+              "".format(self.autoHomeMoveTime))
+        # ^ A long time assumes a touch sensor
+
+    def _addBedHeatupSec(self, meta, cmd_meta):
+        # Wait for bed temperature
+        # such as {'M': '190', 'S': '60.0'}
+        oldBS = self.getBedTemperature()
+        B_S = meta.get('S')
+        if B_S is not None:
+            B_S = float(B_S)
             bedHeatupTime = self.getBedSecRelTemp(B_S)
             self._estS += bedHeatupTime
-            debug("  _estSec += {} bed heatup time from {} to {} auto"
+            debug("_estSec += {} bed heatup time from {} to {}"
                   "".format(bedHeatupTime, oldBS, B_S))
             self.setBedTemperature(B_S)
-            self._estS += self.autoHomeMoveTime
-            debug("  _estSec += {} autoHomeMoveTime"
-                  "".format(self.autoHomeMoveTime))
-            # ^ A long time assumes a touch sensor
-        elif f == "M190":
-            # Wait for bed temperature
-            # such as {'M': '190', 'S': '60.0'}
-            oldBS = self.getBedTemperature()
-            B_S = meta.get('S')
-            if B_S is not None:
-                B_S = float(B_S)
-                bedHeatupTime = self.getBedSecRelTemp(B_S)
-                self._estS += bedHeatupTime
-                debug("_estSec += {} bed heatup time from {} to {}"
-                      "".format(bedHeatupTime, oldBS, B_S))
-                self.setBedTemperature(B_S)
-            else:
-                # TODO: see if self.getBedTemperature differs from the
-                # last bed temp command's S.
-                pass
-        elif f == "M92":
-            # Set Axis Steps-per-unit
-            # such as {'G': '92', 'E': '0'}
+        else:
+            # TODO: see if self.getBedTemperature differs from the
+            # last bed temp command's S.
             pass
-        elif f in ["G0", "G1", "G92"]:
-            # such as:
-            # - {'G': '1', 'X': '50', 'Y': '1.5', 'Z': '0.22',
-            #    'F': '9000'}
-            # - {'G': '1', 'X': '110', 'E': '45', 'F': '500.0'}
-            # - {'G': '1', 'Y': '0.0', 'F': '250.0'}
-            # Caveats:
-            # - "Marlin 2.0 introduces an option to maintain a
-            #   separate default feedrate for G0"
-            #   -<https://marlinfw.org/docs/gcode/G000-G001.html>
-            # - "Coordinates are given in millimeters by default. Units
-            #   may be set to inches by G20."
-            #   -<https://marlinfw.org/docs/gcode/G000-G001.html>
-            oldPos = self.getToolPos()
-            newPos = self.getToolPos()
-            newPos = [meta.get('X'), meta.get('Y'), meta.get('Z')]
-            # ^ Cast to float before using (See the two loops below).
-            deltas = [0.0, 0.0, 0.0]
-            moveAny = False
-            if self.emuState['position_mode'] == 'relative':
-                for i in range(len(newPos)):
-                    if newPos[i] is None:
-                        newPos[i] = 0.0
-                    else:
-                        newPos[i] = float(newPos[i])
-                        moveAny = True
-                    deltas[i] = abs(newPos[i])
-            else:
-                for i in range(len(newPos)):
-                    if newPos[i] is None:
-                        newPos[i] = oldPos[i]
-                    else:
-                        moveAny = True
-                        newPos[i] = float(newPos[i])
-                    deltas[i] = abs(newPos[i]-oldPos[i])
-            distance = math.sqrt(
-                deltas[0]**2 + deltas[1]**2 + deltas[2]**2
-            )
-            # elif f == "G0":
-            # such as:
-            # - {'G': '0', 'F': '4200', 'X': '103.931', 'Y': '57.516',
-            #    'Z': '0.32'}
-            # - {'G': '0', 'F': '4200', 'X': '103.451', 'Y': '57.996'}
-            # - {'G': '0', 'X': '103.251', 'Y': '57.416'}
-
-            F = meta.get('F')  # mm/minute
-            tool = self.emuState['tool']
-            if F is None:
-                oldF = self.emuState['tools'][tool].get('feedrate')
-                if oldF is not None:
-                    F = oldF
+
+    def _addMoveSec(self, meta, cmd_meta):
+        # such as:
+        # - {'G': '1', 'X': '50', 'Y': '1.5', 'Z': '0.22',
+        #    'F': '9000'}
+        # - {'G': '1', 'X': '110', 'E': '45', 'F': '500.0'}
+        # - {'G': '1', 'Y': '0.0', 'F': '250.0'}
+        # Caveats:
+        # - "Marlin 2.0 introduces an option to maintain a
+        #   separate default feedrate for G0"
+        #   -<https://marlinfw.org/docs/gcode/G000-G001.html>
+        # - "Coordinates are given in millimeters by default. Units
+        #   may be set to inches by G20."
+        #   -<https://marlinfw.org/docs/gcode/G000-G001.html>
+        oldPos = self.getToolPos()
+        newPos = self.getToolPos()
+        newPos = [meta.get('X'), meta.get('Y'), meta.get('Z')]
+        # ^ Cast to float before using (See the two loops below).
+        deltas = [0.0, 0.0, 0.0]
+        moveAny = False
+        if self.emuState['position_mode'] == 'relative':
+            for i in range(len(newPos)):
+                if newPos[i] is None:
+                    newPos[i] = 0.0
                 else:
-                    echo0("WARNING: The feedrate is unknown at {}."
-                          "".format(cmd_meta))
-                return
-            else:
-                F = float(F)
-            feedPerSec = F / 60.0
-
-            if moveAny:
-                travelTime = distance / feedPerSec
-                self._estS += travelTime
-                if travelTime > 6:
-                    debug("_estSec += {} travel time ({} / {})"
-                          "".format(travelTime, distance, feedPerSec))
-                    debug("  oldPos: {}".format(oldPos))
-                    debug("  newPos: {}".format(newPos))
-                    debug("  deltas: {}".format(deltas))
-                    debug("  self.emuState['position_mode']: {}"
-                          "".format(self.emuState['position_mode']))
-                self.emuState['position'] = newPos
-                self.emuState['tools'][tool]['feedrate'] = F
-                # ^ A servo feedrate is set below if not returning.
-                return
-            servo = self.emuState['extruder']
-            self.emuState['servos'][servo]['feedrate'] = F
-
-            eDiff = 0.0
-            E = meta.get('E')
-            if E is not None:
-                E = float(E)
-                eDiff = abs(self.getEPos() - E)
-                feedTime = eDiff / feedPerSec
-                self._estS += feedTime
-                debug("_estSec += {} feed time ({} / {})"
-                      "".format(feedTime, eDiff, feedPerSec))
-                self.setEPos(E)
+                    newPos[i] = float(newPos[i])
+                    moveAny = True
+                deltas[i] = abs(newPos[i])
+        else:
+            for i in range(len(newPos)):
+                if newPos[i] is None:
+                    newPos[i] = oldPos[i]
+                else:
+                    moveAny = True
+                    newPos[i] = float(newPos[i])
+                deltas[i] = abs(newPos[i]-oldPos[i])
+        distance = math.sqrt(
+            deltas[0]**2 + deltas[1]**2 + deltas[2]**2
+        )
+        # elif f == "G0":
+        # such as:
+        # - {'G': '0', 'F': '4200', 'X': '103.931', 'Y': '57.516',
+        #    'Z': '0.32'}
+        # - {'G': '0', 'F': '4200', 'X': '103.451', 'Y': '57.996'}
+        # - {'G': '0', 'X': '103.251', 'Y': '57.416'}
+
+        F = meta.get('F')  # mm/minute
+        tool = self.emuState['tool']
+        if F is None:
+            oldF = self.emuState['tools'][tool].get('feedrate')
+            if oldF is not None:
+                F = oldF
             else:
-                echo0('WARNING: Estimating "{}" is not possible since'
-                      ' there was no X, Y, Z, nor E movement.'
-                      ''.format(cmd_meta))
-
-        elif f == "M107":
-            # Fan off
-            # such as {'M': '107'}
-            pass
-        elif f == "M106":
-            # Set fan speed
-            # such as {'M': '106', 'S': '255'}
-            pass
-        elif f == "G90":
-            self.emuState['position_mode'] = 'absolute'
-        elif f == "G91":
-            self.emuState['position_mode'] = 'relative'
-        elif f == "M140":
-            # Set bed temp BUT don't wait.
-            pass
-        elif f == "M117":
-            # Show a message.
-            pass
-        elif f == "M84":
-            # Disable motors.
-            pass
+                echo0("WARNING: The feedrate is unknown at {}."
+                      "".format(cmd_meta))
+            return
         else:
-            echo0("WARNING: The command isn't emulated for estimates"
-                  " or other uses: {}"
-                  "".format(cmd_meta))
-        # Additional relevant commands:
-        # M209: Set auto retract
-        # M141: Set chamber temperature
-
-    def _generateTower(self):
+            F = float(F)
+        feedPerSec = F / 60.0
+
+        if moveAny:
+            travelTime = distance / feedPerSec
+            self._estS += travelTime
+            if travelTime > 6:
+                debug("_estSec += {} travel time ({} / {})"
+                      "".format(travelTime, distance, feedPerSec))
+                debug("  oldPos: {}".format(oldPos))
+                debug("  newPos: {}".format(newPos))
+                debug("  deltas: {}".format(deltas))
+                debug("  self.emuState['position_mode']: {}"
+                      "".format(self.emuState['position_mode']))
+            self.emuState['position'] = newPos
+            self.emuState['tools'][tool]['feedrate'] = F
+            # ^ A servo feedrate is set below if not returning.
+            return
+        servo = self.emuState['extruder']
+        self.emuState['servos'][servo]['feedrate'] = F
+
+        eDiff = 0.0
+        E = meta.get('E')
+        if E is not None:
+            E = float(E)
+            eDiff = abs(self.getEPos() - E)
+            feedTime = eDiff / feedPerSec
+            self._estS += feedTime
+            debug("_estSec += {} feed time ({} / {})"
+                  "".format(feedTime, eDiff, feedPerSec))
+            self.setEPos(E)
+        else:
+            echo0('WARNING: Estimating "{}" is not possible since'
+                  ' there was no X, Y, Z, nor E movement.'
+                  ''.format(cmd_meta))
+
+    def _setAbsolutePositionMode(self, meta, cmd_meta):
+        self.emuState['position_mode'] = 'absolute'
+
+    def _setRelativePositionMode(self, meta, cmd_meta):
+        self.emuState['position_mode'] = 'relative'
+
+    _secMethods = {
+        "G0": _addMoveSec,
+        "G1": _addMoveSec,
+        "G92": _addMoveSec,
+        "M104": _addToolTemperatureSec,  # Set hotend temperature
+        "M109": _addToolHeatupSec,  # Wait for hotend temperature
+        "G4": _addDwellSec,
+        "G28": _addAutoHomeSec,
+        "M190": _addBedHeatupSec,  # Wait for bed temperature
+        "G90": _setAbsolutePositionMode,
+        "G91": _setRelativePositionMode,
+        "M105": None,  # Report temperatures
+        "M82": None,  # Set extrusion to absolute mode
+        "M280": None,  # Set a servo position
+        "M420": None,  # Get and/or set bed leveling state
+        "M92": None,  # Set Axis Steps-per-unit
+        "M107": None,  # Fan off
+        "M106": None,  # Set fan speed
+        "M140": None,  # Set bed temp BUT don't wait.
+        "M117": None,  # Show a message.
+        "M84": None,  # Disable motors.
+    }
+    # ^ The addSecFromMeta method for each command (None to ignore it).
+    #   A dict so each line costs one lookup instead of an elif chain.
+
+    def _generateTower(self, save_settings=True):
         getV = self.getVar
         getS = self.getStat
         setS = self.setStat
-        modS = self._changeStat
-        lvl = 0
-
-        def getL():
-            return getS("level")
-
-        def modL(delta, line_number):
-            global lvl
-            self._changeStat("level", delta, line_number)
-            lvl = getL()
-
-        def setL(value, line_number):
-            global lvl
-            setS("level", value, line_number)
-            lvl = value
 
         cn = self.code_numbers
         heights = self.heights
@@ -1595,18 +1608,22 @@ class GCodeFollower:
         tmprs = self.temperatures
 
         self.clearStats()
-        setS("height", Decimal("0.00"), -1)
-
-        setL(0, -1)
-        setS("new_line_count", 0, -1)
-        setS("stop_building", False, -1)
+        setS("height", 0.0, -1)
+
+        # These locals mirror the stats of the same names, since the
+        # loop reads them for almost every line (Write each change back
+        # with setS so the stats stay current).
+        level = 0
+        setS("level", level, -1)
+        new_line_count = 0
+        setS("new_line_count", new_line_count, -1)
+        stop_building = False
+        setS("stop_building", stop_building, -1)
         last_height = None
         something_printed = False  # Tells the program whether "actual"
         #                          # printing ever occurred yet.
-        deltas = {}  # difference from previous (only for keys in
-        #            # current line)
-        given_values = None  # ONLY values from the current line
-        previous_values = {}
+        previous_z = None  # the Z from the most recent line that had Z
+        previous_z_fixed = None
         previous_dst_line = None
         previous_src_line = None
         line_number = -1
@@ -1615,7 +1632,7 @@ class GCodeFollower:
             if not ok:
                 self.enableUI(True)
                 return False
-            else:
+            elif save_settings:
                 print('* saving "{}"...'
                       ''.format(GCodeFollower._settingsPath))
                 self.saveSettings()
@@ -1627,113 +1644,154 @@ class GCodeFollower:
                     + getV("template_gcode_path"))
         # os.path.splitext(getV("template_gcode_path"))[0]
         # + "_" + range + ".gcode"
-        dant_shown = {}  # debug accessing new temperature
-        dnlh_shown = {}  # debug next level height
-        dnnh_shown = {}  # debug no next height
-        dwfnh_shown = {}  # debug wait for height before changing level
+        # Levels for which each verbose message was already shown:
+        dant_shown = set()  # debug accessing new temperature
+        dnlh_shown = set()  # debug next level height
+        dnnh_shown = set()  # debug no next height
+        dwfnh_shown = set()  # debug wait for height before changing level
+        heights_fixed = [to_fixed(h) for h in heights]
+        max_z_fixed = to_fixed(getV("max_z_build_movement"))
         bytes_total = os.path.getsize(getV("template_gcode_path"))
         bytes_count = 0
+        progress_unit = max(1, round(bytes_total/100))  # bytes per 1%
+        next_progress_bytes = 0.5 * progress_unit
+        # ^ where the rounded percentage next changes (progress is only
+        #   set then instead of formatted again for every line)
         setS("progress", "0%", -1)
         prev_line_len = 0
         template_gcode_path = getV("template_gcode_path")
         print("* reading \"{}\"...".format(template_gcode_path))
-        with open(template_gcode_path) as ins:
-            with open(tmp_path, 'w') as outs:
+        # region loop invariants
+        heights_len = len(heights)
+        tmprs_len = len(tmprs)
+        end_retraction_flag = GCodeFollower._end_retraction_flag
+        stw_prefix = stw_cmd + " "
+        # ^ the start of a temperature line to change
+        fan_code = cn['set fan speed']
+        verbose = self._verbose
+        addSecM = self.addSecFromMeta  # called for nearly every line
+        stw_lines = ["{} {}{:.2f}".format(stw_cmd, stw_param0, tmpr)
+                     for tmpr in tmprs]
+        # ^ the new line for each level (see tmprs[level] below)
+        cached_next_l = None  # the next_l that next_l_h & next_l_t are for
+        # endregion loop invariants
+        out_lines = []  # Lines are buffered then written in batches.
+        writeL = out_lines.append
+        batch_size = GCodeFollower._writeBatchSize
+        with open(template_gcode_path, 'r', buffering=1048576,
+                  encoding=GCodeFollower._gcodeEncoding,
+                  newline='') as ins:
+            # ^ newline='' skips newline translation since each line is
+            #   stripped and written with "\n" anyway.
+            with open(tmp_path, 'w', buffering=1048576,
+                      encoding=GCodeFollower._gcodeEncoding) as outs:
                 line_number = 0
                 for original_line in ins:
+                    if len(out_lines) >= batch_size:
+                        outs.write("\n".join(out_lines) + "\n")
+                        del out_lines[:]
                     bytes_count += prev_line_len
-                    setS(
-                        "progress",
-                        (str(round(bytes_count/round(bytes_total/100)))
-                         + "%"),
-                        line_number
-                    )
+                    if bytes_count >= next_progress_bytes:
+                        percent = round(bytes_count/progress_unit)
+                        setS("progress", str(percent) + "%", line_number)
+                        next_progress_bytes = (percent + 0.5) * progress_unit
                     prev_line_len = len(original_line)
-                    next_l_h = None  # next level's height
-                    next_l_t = None  # next level's temperature
-                    if getS("level") + 1 < len(heights):
-                        next_l_h = heights[getS("level") + 1]
-                        if self._verbose:
-                            l_str = str(getS("level") + 1)
-                            if dnlh_shown.get(l_str) is not True:
-                                echoP("* INFO: The next height (for"
-                                      " level {}) is"
-                                      " {}.".format(l_str, next_l_h))
-                                dnlh_shown[l_str] = True
-                    else:
-                        if self._verbose:
-                            l_str = str(getS("level") + 1)
-                            if dnnh_shown.get(l_str) is not True:
-                                echoP("* INFO: There is no height for"
-                                      " the next level"
-                                      " ({}).".format(l_str))
-                                dnnh_shown[l_str] = True
-                    if getS("level") + 1 < len(tmprs):
-                        next_l_t = tmprs[getS("level") + 1]
-                        if self._verbose:
-                            l_str = str(getS("level") + 1)
-                            if dant_shown.get(l_str) is not True:
-                                echoP("* INFO: A temperature for level"
-                                      " {} is being"
-                                      " accessed.".format(l_str))
-                                dant_shown[l_str] = True
-                    if given_values is not None:
-                        for k, v in given_values.items():
-                            previous_values[k] = v
-                    given_values = {}  # This is ONLY for the current
-                    #                  # command. Other known (past)
-                    #                  # values are in stats.
+                    next_l = level + 1  # next level
+                    if next_l != cached_next_l:
+                        # The level changed, so look up its boundaries
+                        # once instead of for every line.
+                        cached_next_l = next_l
+                        next_l_h = None  # next level's height
+                        next_l_t = None  # next level's temperature
+                        if next_l < heights_len:
+                            next_l_h = heights[next_l]
+                            if verbose:
+                                if next_l not in dnlh_shown:
+                                    echoP("* INFO: The next height (for"
+                                          " level {}) is"
+                                          " {}.".format(next_l, next_l_h))
+                                    dnlh_shown.add(next_l)
+                        else:
+                            if verbose:
+                                if next_l not in dnnh_shown:
+                                    echoP("* INFO: There is no height for"
+                                          " the next level"
+                                          " ({}).".format(next_l))
+                                    dnnh_shown.add(next_l)
+                        if next_l < tmprs_len:
+                            next_l_t = tmprs[next_l]
+                            if verbose:
+                                if next_l not in dant_shown:
+                                    echoP("* INFO: A temperature for level"
+                                          " {} is being"
+                                          " accessed.".format(next_l))
+                                    dant_shown.add(next_l)
+                    given_x = None  # given_* are ONLY for the current
+                    given_y = None  # command. Other known (past)
+                    given_z = None  # values are in stats.
+                    given_e = None
                     line_number += 1
-                    line = original_line.rstrip()
+                    unterminated_line = original_line.rstrip("\r\n")
+                    line = unterminated_line.rstrip()
                     double_blank = False
                     if previous_dst_line is not None:
                         if ((len(previous_dst_line) == 0) and
                                 (len(line) == 0)):
                             double_blank = True
                     previous_src_line = line
-                    cmd_meta = get_cmd_meta(line)
+                    if (len(line) == 0) or (line[0] == ";"):
+                        # Pass blank & comment lines through unparsed
+                        # (same as the `cmd_meta is None` case below).
+                        if ((not stop_building) or
+                                (not double_blank)):
+                            addSecM(None)
+                            writeL(unterminated_line)
+                            previous_dst_line = line
+                        continue
+                    cmd_meta = get_cmd_meta(line, warn=False)
+                    # ^ Bad numbers are reported below (with line#).
                     would_extrude = False
                     would_move_for_build = False
                     would_build = False
-                    deltas = {}
-                    part_indices = {}
+                    delta_z = None  # difference from previous_z
+                    delta_z_fixed = None
+                    z_part = None  # the Z param such as ['Z', '0.2']
                     if cmd_meta is not None:
-                        for i in range(1, len(cmd_meta)):
-                            part_indices[cmd_meta[i][0]] = i
-                            if len(cmd_meta[i]) < 2:
+                        for part in cmd_meta[1:]:
+                            param = part[0]
+                            if param == "Z":
+                                z_part = part
+                            if len(part) < 2:
                                 continue  # no value; just letter param
-                            elif len(cmd_meta[i]) > 2:
-                                echoP("Line {}: WARNING: extra param"
-                                      " (this should never happen) in"
-                                      " '{}'".format(line_number, line))
+                            # ^ (get_cmd_meta never makes more than 2)
                             try:
-                                setS(cmd_meta[i][0],
-                                     Decimal(cmd_meta[i][1]),
-                                     line_number)
-                                given_values[cmd_meta[i][0]] = Decimal(
-                                    cmd_meta[i][1]
+                                value = float(part[1])
+                            except ValueError:
+                                echoP(
+                                    "Line {}: ERROR: Bad number"
+                                    " (ValueError):"
+                                    " '{}'".format(line_number, part[1])
                                 )
-                            except decimal.InvalidOperation as e:
-                                if type(e) == decimal.ConversionSyntax:
-                                    echoP(
-                                        "Line {}: ERROR: Bad"
-                                        " conversion syntax:"
-                                        " '{}'".format(line_number,
-                                                       cmd_meta[i][1])
-                                    )
-                                else:
-                                    echoP(
-                                        "Line {}: ERROR: Bad Decimal"
-                                        " (InvalidOperation):"
-                                        " '{}'".format(line_number,
-                                                       cmd_meta[i][1])
-                                    )
                                 echoP("  cmd_meta: {}".format(cmd_meta))
-                        for k, v in given_values.items():
-                            previous_v = previous_values.get(k)
-                            if previous_v is not None:
-                                deltas[k] = v - previous_v
-                        if getS("stop_building"):
+                                continue
+                            setS(param, value, line_number)
+                            if param == "X":
+                                given_x = value
+                            elif param == "Y":
+                                given_y = value
+                            elif param == "Z":
+                                given_z = value
+                            elif param == "E":
+                                given_e = value
+                        if given_z is not None:
+                            given_z_fixed = to_fixed(given_z)
+                            if previous_z is not None:
+                                delta_z = given_z - previous_z
+                                delta_z_fixed = (given_z_fixed
+                                                 - previous_z_fixed)
+                            previous_z = given_z
+                            previous_z_fixed = given_z_fixed
+                        if stop_building:
                             # echoP(str(cmd_meta))
                             if (len(cmd_meta) == 2):
                                 if (cmd_meta[1][0] == "F"):
@@ -1753,75 +1811,90 @@ class GCodeFollower:
                             #           " in: {}".format(line_number,
                             #                            cmd_meta))
                     if cmd_meta is None:
-                        if ((not getS("stop_building")) or
+                        if ((not stop_building) or
                                 (not double_blank)):
-                            self.addSec(original_line)
-                            outs.write(
-                                (original_line.rstrip("\n").rstrip("\r")
-                                 + "\n")
-                            )
+                            addSecM(cmd_meta)
+                            writeL(unterminated_line)
                             previous_dst_line = line
                         continue
                     # cmdStr ''.join(cmd_meta[0])  # such as "M117"
+                    code_letter, code_str = cmd_meta[0][0], cmd_meta[0][1:2]
+                    # ^ [1:2] is [] if there is no number (such as "T")
                     try:
-                        code_number = int(cmd_meta[0][1])
-                    except ValueError as ex:
+                        code_number = int(code_str[0])
+                    except ValueError:
+                        code_number = None
+                    except IndexError as ex:
                         print("Error in cmd_meta: {}".format(cmd_meta))
                         raise ex
-
-                    if cmd_meta[0][0] == "G":
-                        if given_values.get('E') is not None:
-                            would_extrude = True
-                            # if (comment is not None) or
-                            # (GCodeFollower._end_retraction_flag in
-                            # comment):
-                            if GCodeFollower._end_retraction_flag in line:
-                                if Decimal(given_values.get('E')) < 0:
-                                    # NOTE: Otherwise includes
-                                    # retractions in end gcode
-                                    # (negative # after E)
-                                    would_extrude = False
-                            # Otherwise, discard BOTH negative and
-                            # positive filament feeding after tower is
-                            # finished.
+                    if code_number is None:
+                        # (not in the except above, so an error here
+                        # isn't chained to the int error)
+                        try:
+                            code_number = float(code_str[0])
+                            # ^ a subcode such as G92.1 (pass it through)
+                        except ValueError as ex:
+                            print("Error in cmd_meta: {}".format(cmd_meta))
+                            raise ex
+
+                    if code_letter == "G":
+                        if given_e is not None:
+                            would_extrude = not (
+                                (given_e < 0)
+                                and (end_retraction_flag
+                                     in line.partition(";")[2])
+                            )
+                            # ^ Only a retraction can be the end
+                            #   retraction, so the comment is only
+                            #   split off and searched then. A
+                            #   retraction marked by the flag is not
+                            #   extrusion (Otherwise it would include
+                            #   retractions in end gcode). Otherwise,
+                            #   discard BOTH negative and positive
+                            #   filament feeding after tower is
+                            #   finished.
+                            if (stop_building and would_extrude
+                                    and (code_number in (0, 1))
+                                    and not verbose):
+                                continue
+                                # ^ Drop it now: would_build (below)
+                                #   can only be True & the move checks
+                                #   only add verbose messages.
                         # NOTE: homing is still allowed (values without
-                        # params are not in given_values).
-                        if given_values.get('X') is not None:
-                            if (given_values.get('Y') is not None):
-                                would_move_for_build = True
-                            elif (given_values.get('Z') is not None):
-                                would_move_for_build = True
-                            elif given_values.get('X') != Decimal("0.00"):
-                                would_move_for_build = True
-                            else:
-                                # it is homing X, so it isn't building
-                                pass
+                        # params leave given_* None).
+                        if ((given_x is not None)
+                                and ((given_y is not None)
+                                     or (given_z is not None)
+                                     or (given_x != 0.0))):
+                            would_move_for_build = True
+                            # ^ X alone at 0 is homing X, so it isn't
+                            #   building.
                         # elif given_values.get('Y') is not None:
                             # # NOTE: This can't help but eliminate
                             # # moving the (Prusa-style) bed forward
                             # # for easy removal in end gcode.
                             # would_move_for_build = True
-                        delta_z = deltas.get("Z")
                         if (delta_z is not None):
-                            if (abs(delta_z) <= getV("max_z_build_movement")):
+                            if abs(delta_z_fixed) <= max_z_fixed:
                                 # This is too small to be a necessary
                                 # move (it is probably moving to the
                                 # next layer)
                                 would_move_for_build = True
-                            elif (getS("stop_building") and
+                            elif (verbose and
+                                    stop_building and
                                     not would_move_for_build):
-                                echoP("Line {}: Moving from {} (from"
-                                      " line {}) to {} would"
-                                      " move a lot {}"
+                                echoP("Line {}: Moving from {:.3f} (from"
+                                      " line {}) to {:.3f} would"
+                                      " move a lot {:.3f}"
                                       " (keeping '{}').".format(
                                         line_number,
                                         getS("Z"),
                                         self.getStatLine("Z"),
-                                        given_values.get("Z"),
-                                        abs(deltas.get("Z")),
+                                        given_z,
+                                        abs(delta_z),
                                         line
                                       ))
-                        elif (getS("stop_building") and
+                        elif (stop_building and
                                 (getS("Z") is None)):
                             echoP("Line {}: ERROR: No recorded z delta"
                                   "but build is"
@@ -1831,24 +1904,25 @@ class GCodeFollower:
                                        would_move_for_build)
 
                         if (code_number == 1) or (code_number == 0):
-                            if getS("stop_building"):
+                            if stop_building:
                                 if would_build:
                                     # NOTE: this removes any retraction
                                     # (negative value after 'E' param)
                                     # in stop gcode.
                                     continue
-                                else:
+                                elif verbose:
                                     echoP(
                                         "Line {}: WARNING: Allowing"
                                         " '{}' after stop (z"
                                         " delta {})".format(
                                             line_number,
                                             line,
-                                            deltas.get("Z")
+                                            (None if delta_z is None
+                                             else "{:.3f}".format(delta_z))
                                         )
                                     )
-                            self.addSec(line)
-                            outs.write(line + "\n")
+                            addSecM(cmd_meta)
+                            writeL(line)
                             previous_dst_line = line  # It's just a
                             #                         # movement, so
                             #                         # don't edit it.
@@ -1857,15 +1931,13 @@ class GCodeFollower:
                             #                         # after it if it
                             #                         # is a new level
                             #                         # (below).
-                            given_z = given_values.get("Z")
-                            z_index = part_indices.get("Z")
-                            if z_index is None:
+                            if z_part is None:
                                 continue
-                            if len(cmd_meta[z_index]) == 1:
-                                setS("height", Decimal("0.00"),
-                                     line_number)
+                            if len(z_part) == 1:
+                                setS("height", 0.0, line_number)
                                 last_height = getS("height")
-                                setL(0, line_number)
+                                level = 0
+                                setS("level", level, line_number)
                                 # echoP("Line {}: Missing value after"
                                 #       " '{}'".format(
                                 #     line_number,
@@ -1874,32 +1946,38 @@ class GCodeFollower:
                                 # continue
                                 # if len(cmd_meta[1]) == 1:  # already
                                 #                            # checked
-                                echoP("Line {}: INFO: Homing was"
-                                      " detected so"
-                                      " level & height were changed"
-                                      " to 0...")
+                                if verbose:
+                                    echoP("Line {}: INFO: Homing was"
+                                          " detected so level & height"
+                                          " were changed to"
+                                          " 0...".format(line_number))
                                 continue
+                            elif given_z is None:
+                                continue  # bad number (reported above)
                             else:
                                 # NOTE: already determined to have "Z"
                                 #   (See `continue` further up.)
-                                # NOTE: len(cmd_meta[z_index]) cannot be
-                                #   0 since it is obtained using split.
-                                setS("height",
-                                     Decimal(cmd_meta[z_index][1]),
-                                     line_number)
+                                # NOTE: given_z & given_z_fixed were
+                                #   parsed from z_part above.
+                                setS("height", given_z, line_number)
                                 # if self._verbose:
                                 #     echoP(
                                 #         "* INFO: Z is now {} due to"
                                 #         " {}".format(
-                                #             cmd_meta[z_index][1],
+                                #             z_part[1],
                                 #             cmd_meta
                                 #         )
                                 #     )
-                                last_height = getS("height")
-                                lvl = getS("level")
-                                h = getS("height")
+                                last_height = given_z
+                                h = given_z
+                                h_fixed = given_z_fixed
+                                # the highest level whose height has
+                                # been reached (heights are ascending):
+                                reached = bisect.bisect_right(
+                                    heights_fixed, h_fixed) - 1
                                 if next_l_h is None:
-                                    if not getS("stop_building"):
+                                    if not stop_building:
+                                        stop_building = True
                                         setS("stop_building", True,
                                              line_number)
                                         estHr, estMin, estLeft = (
@@ -1914,24 +1992,21 @@ class GCodeFollower:
                                                         estMin,
                                                         estLeft))
                                         # self.addSec(original_line)
-                                        outs.write(
-                                            (self._stop_building_msg
-                                             + "\n")
-                                        )
+                                        writeL(self._stop_building_msg)
                                         if next_l_t is not None:
                                             echoP(
                                                 "* Line {}: The tower"
                                                 " ends (there is no"
                                                 " level beyond {}) at"
-                                                " {} before the"
+                                                " {:.3f} before the"
                                                 " temperature range, so"
                                                 " there will be no"
                                                 " temperature beyond {}"
                                                 .format(
                                                     line_number,
-                                                    getL(),
+                                                    level,
                                                     h,
-                                                    tmprs[getL()]
+                                                    tmprs[level]
                                                 )
                                             )
                                         else:
@@ -1939,16 +2014,16 @@ class GCodeFollower:
                                                 "* Line {}: The tower"
                                                 " ends (there is no"
                                                 " level beyond {}) at"
-                                                " {} nor another level"
+                                                " {:.3f} nor another level"
                                                 " in the temperature"
                                                 " range, so there will"
                                                 " be no temperature"
                                                 " beyond {}"
                                                 .format(
                                                     line_number,
-                                                    getL(),
+                                                    level,
                                                     h,
-                                                    tmprs[getL()]
+                                                    tmprs[level]
                                                 )
                                             )
                                         echoP("  (Future extrusion"
@@ -1956,11 +2031,12 @@ class GCodeFollower:
                                               " suppressed)")
 
                                         continue
-                                elif h >= next_l_h:
+                                elif reached > level:
                                     # This code can still be reached if
                                     # not would_extrude:
                                     if next_l_t is None:
-                                        if not getS("stop_building"):
+                                        if not stop_building:
+                                            stop_building = True
                                             setS("stop_building", True,
                                                  line_number)
                                             print("ESTIMATE: {}s"
@@ -1976,9 +2052,8 @@ class GCodeFollower:
                                                             estMin,
                                                             estLeft))
                                             # self.addSec(original_line)
-                                            outs.write(
-                                                (self._stop_building_msg
-                                                 + "\n")
+                                            writeL(
+                                                self._stop_building_msg
                                             )
                                             echoP(
                                                 "* Line {}: The tower"
@@ -1986,9 +2061,9 @@ class GCodeFollower:
                                                 " since there is no new"
                                                 " temperature available"
                                                 " (no level beyond {})"
-                                                " at {}".format(
+                                                " at {:.3f}".format(
                                                     line_number,
-                                                    getL(),
+                                                    level,
                                                     h
                                                 )
                                             )
@@ -1998,27 +2073,29 @@ class GCodeFollower:
                                         continue
                                     if not start_temperature_found:
                                         # setL("level", 0, line_number)
-                                        echoP(
-                                            "Line {}: INFO: Splicing"
-                                            " temperature at {} will be"
-                                            " skipped since the old set"
-                                            " temp and wait ({}) wasn't"
-                                            " found yet (level is {}),"
-                                            " so this is z move is"
-                                            " presumably start"
-                                            " gcode.".format(
-                                                line_number,
-                                                h,
-                                                stw_cmd,
-                                                getL()
+                                        if verbose:
+                                            echoP(
+                                                "Line {}: INFO: Splicing"
+                                                " temperature at {:.3f} will"
+                                                " be skipped since the old set"
+                                                " temp and wait ({}) wasn't"
+                                                " found yet (level is {}),"
+                                                " so this is z move is"
+                                                " presumably start"
+                                                " gcode.".format(
+                                                    line_number,
+                                                    h,
+                                                    stw_cmd,
+                                                    level
+                                                )
                                             )
-                                        )
-                                    elif ((len(heights) > lvl + 2) and
-                                            (h > heights[lvl + 2])):
+                                    elif ((reached > level + 1) and
+                                            (h_fixed
+                                             > heights_fixed[level + 2])):
                                         echoP(
                                             "Line {}: WARNING: Splicing"
                                             " temperature at height"
-                                            " {} will be skipped since"
+                                            " {:.3f} will be skipped since"
                                             " the height is greater"
                                             " than the next level after"
                                             " the one starting here"
@@ -2030,70 +2107,65 @@ class GCodeFollower:
                                             )
                                         )
                                     else:
-                                        # if lvl + 1 < len(tmprs):
+                                        # if level + 1 < len(tmprs):
                                         # already checked (see this
                                         # clause and the previous `if`
                                         # clause).
-                                        modL(1, line_number)
-                                        if self._verbose:
+                                        level += 1
+                                        setS("level", level, line_number)
+                                        if verbose:
                                             echoP(
                                                 "Line {}: INFO: "
                                                 " **temperature** at"
-                                                " height {} will"
+                                                " height {:.3f} will"
                                                 " become {} (for"
                                                 " level {})".format(
                                                     line_number,
                                                     h,
-                                                    tmprs[getL()],
-                                                    getL()
+                                                    tmprs[level],
+                                                    level
                                                 )
                                             )
-                                        new_line = "{} {}{:.2f}".format(
-                                            stw_cmd,
-                                            stw_param0,
-                                            tmprs[getL()]
-                                        )
+                                        new_line = stw_lines[level]
                                         # echoP(new_line)
                                         self.addSec(new_line)
-                                        outs.write(new_line + "\n")
+                                        writeL(new_line)
                                         previous_dst_line = new_line
-                                        modS("new_line_count", 1,
-                                             line_number)
+                                        new_line_count += 1
+                                        setS("new_line_count",
+                                             new_line_count, line_number)
                                         echoP(
-                                            "Line {}: Inserted:"
-                                            " {}".format(
+                                            "Line {}: Inserted: {}"
+                                            "\n- after '{}'"
+                                            "\n- new line #: {}".format(
                                                 line_number,
-                                                new_line
+                                                new_line,
+                                                line,
+                                                (line_number
+                                                 + new_line_count)
                                             )
                                         )
-                                        echoP("- after"
-                                              " '{}'".format(line))
-                                        echoP("- new line #: {}".format(
-                                            (line_number
-                                             + getS("new_line_count"))
-                                        ))
                                 else:
-                                    if self._verbose:
-                                        l_str = str(getL() + 1)
-                                        if dwfnh_shown.get(l_str) is not True:
+                                    if verbose:
+                                        if next_l not in dwfnh_shown:
                                             # echoP(
                                             #     "* INFO: The next"
                                             #     " height (for level"
                                             #     " {}) of {} has not"
                                             #     " yet been reached"
                                             #     " at {}.".format(
-                                            #         l_str,
+                                            #         next_l,
                                             #         next_l_h,
                                             #         h
                                             #     )
                                             # )
-                                            dwfnh_shown[l_str] = True
+                                            dwfnh_shown.add(next_l)
 #
                         else:  # some other G code
-                            if getS("stop_building"):
+                            if stop_building:
                                 if would_build:
                                     continue
-                                else:
+                                elif verbose:
                                     if code_number == 91:
                                         echoP(
                                             "Line {}: INFO:"
@@ -2111,23 +2183,26 @@ class GCodeFollower:
                                                 line_number, line
                                             )
                                         )
-                            self.addSec(line)
-                            outs.write(line + "\n")
+                            addSecM(cmd_meta)
+                            writeL(line)
                             previous_dst_line = line
 
-                    elif cmd_meta[0][0] == "M":
-                        if line[0:5] == stw_cmd + " ":
+                    elif code_letter == "M":
+                        if line.startswith(stw_prefix):
                             # ^self.commands['set temperature and wait']
-                            #  (usually M109)
+                            #  (usually M109) followed by a space at the
+                            #  start of the line, so "M109 ; comment"
+                            #  is changed but an indented M109 or a bare
+                            #  M109 (with nothing after it) is not.
                             # (extruder temperature)
                             # d for decimal integer format (with no
                             # decimals):
                             new_line = "{} {}{:d}".format(stw_cmd,
                                                           stw_param0,
-                                                          tmprs[getL()])
+                                                          tmprs[level])
                             if start_temperature_found:
                                 echoP("Line {}: Extra temperature"
-                                      " command at {}:"
+                                      " command at {:.3f}:"
                                       " {}".format(line_number,
                                                    getS("height"), line)
                                       + "\n- changed to: " + new_line
@@ -2135,7 +2210,7 @@ class GCodeFollower:
                             else:
                                 echoP(
                                     "Line {}: Initial temperature"
-                                    " command at {}:"
+                                    " command at {:.3f}:"
                                     " {}".format(line_number,
                                                  getS("height"),
                                                  line)
@@ -2143,32 +2218,35 @@ class GCodeFollower:
                                     + "..."
                                 )
                             self.addSec(new_line)
-                            outs.write(new_line + "\n")
+                            writeL(new_line)
                             previous_dst_line = line
-                            # if getL() == 0:
-                            #     if getL() + 1 < len(tmprs):
+                            # if level == 0:
+                            #     if level + 1 < len(tmprs):
                             #         modL(1, line_number)
                             #         # echoP("Level {} is "
                             #         #       "next.".format(
-                            #         #         getL())
+                            #         #         level)
                             #         #       )
                             start_temperature_found = True
-                        elif (getS("stop_building") and
-                                (code_number == cn['set fan speed'])):
+                        elif (stop_building and
+                                (code_number == fan_code)):
                             # Do not keep the fan speed line.
                             continue
                         else:
-                            self.addSec(line)
-                            outs.write(line + "\n")
+                            addSecM(cmd_meta)
+                            writeL(line)
                             previous_dst_line = line
                     else:
-                        self.addSec(line)
-                        outs.write(line + "\n")
+                        addSecM(cmd_meta)
+                        writeL(line)
                         previous_dst_line = line
                         pass
                         # echoP("Unknown command:"
                         #       " {}".format(cmd_meta[0][0]))
-        shutil.move(tmp_path, dst_path)
+                if len(out_lines) > 0:
+                    outs.write("\n".join(out_lines) + "\n")
+                    del out_lines[:]
+        os.replace(tmp_path, dst_path)  # a rename, never a copy
         etaTimeStr = getHMSMessageFromS(self._estS)
         extTimeStr = getHMSMessageFromS(self._extrudeS)
         self.echo("100% (done; saved {};"
@@ -9,12 +9,14 @@ Copyright (C) 2019  Jake "Poikilos" Gustafson
 
 import os
 import sys
-import threading
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from gcodefollower import (
     GCodeFollower,
     GCodeFollowerArgParser,
     echo0,
     echo1,
+    show_fewest,
 )
 # import tk_cli_dummy as tk  # This is for synchronizing code between
 #                            # CLI and non-CLI versions.
@@ -46,34 +48,54 @@ def usage():
     print("  " + sys.argv[0] + " 190 210")
     # print(sys.argv[0] + " tower.gcode")
     print("  " + sys.argv[0] + " tower.gcode 190 210")
+    print("  " + sys.argv[0] + " tower.gcode tower2.gcode 190 210")
     print("")
 
 
+def stat_str(value):
+    '''
+    Show a stat the way the G-code shows it (such as 900 rather than
+    900.0, since the values are parsed as float).
+    '''
+    if isinstance(value, float):
+        return show_fewest("{:.6f}".format(value))
+        # ^ 6 places hide float error (such as in a sum of E values)
+    return "{}".format(value)
+
+
 class Application():
-    def __init__(self):
-        self.generateTimer = None
+    def __init__(self, name=None):
+        self.ran = False
+        self.name = name
+        # ^ If not None, show it before each message (to tell apart the
+        #   output of worker processes generating different files).
 
-    def run(self):
-        global gcode
-        gcode = GCodeFollower(echo_callback=self.echo,
-                              enable_ui_callback=self.enableUI,
-                              verbose=runParams.verbose)
+    def run(self, save=True):
+        '''
+        Check the settings then generate the tower.
 
-        gcode.saveDocumentationOnce()
-        if self.generateTimer is not None:
-            raise RuntimeError("Call `run` only once per Application.")
-        try:
-            # usage()  # for debug only
-            if runParams.temperatures is None:
-                usage()
-                raise ValueError("You must specify minimum & maximum.")
+        Keyword arguments:
+        save -- Save the settings and their documentation. Set this to
+            False in a worker process (main saves them once before
+            starting the workers, so the workers can't race to write
+            them).
 
-            gcode.setRangeVar('temperature', 0, runParams.temperatures[0])
-            gcode.setRangeVar('temperature', 1, runParams.temperatures[1])
-            if runParams.template_gcode_path is not None:
-                gcode.setVar('template_gcode_path',
-                             runParams.template_gcode_path)
+        Returns: the exit code.
+        '''
+        code = self.prepare(save=save)
+        if code != 0:
+            return code
+        return self.generateTower(save=save)
 
+    def prepare(self, save=True):
+        '''
+        Apply runParams and check the settings (See run).
+
+        Returns: the exit code (0 if the tower can be generated).
+        '''
+        self._start(save=save)
+        try:
+            self._applyParams()
             ok, err = gcode.checkSettings()
             if err is not None:
                 self.echo(err)
@@ -83,64 +105,153 @@ class Application():
                 return 1
         except ValueError:
             usage()
-            print("")
-            print("ERROR:")
-            print("- You must specify the temperature range.")
-            if not os.path.isfile(gcode._settingsPath):
-                gcode.saveSettings()
-            return 2
+            return self._fail(2, "- You must specify the temperature"
+                                 " range.")
         except FileNotFoundError:
             # self.echo("")
             # checkSettings already called echo_callback in this case.
-            print("")
-            print("ERROR:")
-            print("'{}' does not"
-                  " exist.".format(gcode.getVar("template_gcode_path")))
             tgp = gcode.getVar("template_gcode_path")
-            tn = GCodeFollower._towerName
+            msg = "'{}' does not exist.".format(tgp)
             if tgp == gcode.getVar("default_path"):
-                print("You must first slice {}:".format(tn))
-                for thisURL in gcode._downloadPageURLs:
-                    print("  {}".format(thisURL))
-            print("")
-            if not os.path.isfile(gcode._settingsPath):
-                gcode.saveSettings()
-            return 3
-        return self.generateTower()
+                msg += ("\nYou must first slice {}:\n  ".format(
+                            GCodeFollower._towerName)
+                        + "\n  ".join(gcode._downloadPageURLs))
+            return self._fail(3, msg + "\n")
+        return 0
+
+    def saveSettings(self):
+        '''
+        Apply runParams and save the settings and their documentation
+        without checking anything about the template file (main does
+        this once before workers generate each file, so a missing or bad
+        file doesn't keep the others from being generated).
+
+        Returns: the exit code (0 if the settings were saved).
+        '''
+        self._start()
+        try:
+            self._applyParams()
+        except ValueError:
+            usage()
+            return self._fail(2, "- You must specify the temperature"
+                                 " range.")
+        gcode.saveSettings()
+        return 0
+
+    def _start(self, save=True):
+        '''
+        Create the GCodeFollower (See run for save).
+        '''
+        global gcode
+        gcode = GCodeFollower(echo_callback=self.echo,
+                              enable_ui_callback=self.enableUI,
+                              verbose=runParams.verbose)
+
+        if save:
+            gcode.saveDocumentationOnce()
+        if self.ran:
+            raise RuntimeError("Call `run` only once per Application.")
+        self.ran = True
+
+    def _applyParams(self):
+        '''
+        Set the temperature range and template_gcode_path from
+        runParams, or raise ValueError if there is no valid range.
+        '''
+        if runParams.temperatures is None:
+            # (usage is shown by the caller's ValueError handler)
+            raise ValueError("You must specify minimum & maximum.")
+
+        gcode.setRangeVar('temperature', 0, runParams.temperatures[0])
+        gcode.setRangeVar('temperature', 1, runParams.temperatures[1])
+        if runParams.template_gcode_path is not None:
+            gcode.setVar('template_gcode_path',
+                         runParams.template_gcode_path)
+
+    def _fail(self, code, msg):
+        '''
+        Show msg as an error, save default settings if there are none
+        yet (so the user can edit them), and return code.
+        '''
+        self.echo("\nERROR:\n" + msg)
+        if not os.path.isfile(gcode._settingsPath):
+            gcode.saveSettings()
+        return code
 
     def enableUI(self, enable):
         if enable:
             if len(gcode.stats) > 0:
-                print("The process completed.")
-                print("")
-                print("Stats:")
-                for k, v in gcode.stats.items():
-                    print("  {}: {}".format(k, v))
+                self.echo(
+                    "The process completed.\n\nStats:\n"
+                    + "\n".join("  {}: {}".format(k, stat_str(v))
+                                for k, v in gcode.stats.items())
+                )
         else:
-            print("please wait...")
+            self.echo("please wait...")
 
     def echo(self, msg):
+        if self.name is not None:
+            msg = "\n".join("[{}] {}".format(self.name, line)
+                            for line in msg.split("\n"))
         print(msg)
 
-    def generateTower(self):
+    def generateTower(self, save=True):
         gcode.enableUI(False)  # generateTower will call
         #                      # enable_ui_callback(true).
-        # Start a thread, so that events related to enableUI(False) can
-        # occur before processing.
-        self.generateTimer = threading.Timer(0.01, gcode.generateTower)
-        self.generateTimer.start()
+        # There is no event loop in the CLI, so run it directly (The
+        # GUI uses a thread so the window can update first).
+        if not gcode.generateTower(save_settings=save):
+            return 1
         return 0
 
 
+def process_file(params, template_gcode_path):
+    '''
+    Generate the tower for one of several files (runs in a worker
+    process started by main, which already saved the settings).
+
+    Sequential arguments:
+    params -- The GCodeFollowerArgParser from the main process.
+    template_gcode_path -- The file to use instead of the first.
+
+    Returns: the exit code of Application.run.
+    '''
+    global runParams
+    runParams = copy.copy(params)
+    runParams.template_gcode_path = template_gcode_path
+    return Application(name=template_gcode_path).run(save=False)
+
+
 def main():
     global runParams
     print("Welcome to Tower Configuration by Poikilos.")
     print("")
     runParams = GCodeFollowerArgParser()
     if runParams.help:
-        gcode = GCodeFollower()  # Initialize the help system.
         usage()
         return 0
+    paths = runParams.template_gcode_paths
+    if len(paths) > 1:
+        # Save the settings once here so the workers only generate.
+        code = Application().saveSettings()
+        if code != 0:
+            return code
+        # Each file is independent, so generate them in parallel.
+        echo0("* processing {} files".format(len(paths)))
+        codes = []
+        with ProcessPoolExecutor() as executor:
+            futures = {executor.submit(process_file, runParams, path): path
+                       for path in paths}
+            for future in as_completed(futures):
+                try:
+                    codes.append(future.result())
+                except Exception as ex:
+                    # ^ Show it and keep going, since the other files
+                    #   may still be generated.
+                    echo0("[{}] ERROR: {}: {}".format(
+                        futures[future], type(ex).__name__, ex))
+                    codes.append(1)
+        return max(codes)
     app = Application()
     echo0("* scheduling")
     code = app.run()
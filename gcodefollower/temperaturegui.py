@@ -9,8 +9,6 @@ from __future__ import print_function
 from __future__ import division
 import os
 import sys
-import decimal
-from decimal import Decimal
 import threading
 try:
     import Tkinter as tk
@@ -244,7 +242,6 @@ def main():
 
     runParams = GCodeFollowerArgParser()
     if runParams.help:
-        gcode = GCodeFollower()  # Initialize the help system.
         usage()
         return 0
     frame = ConfigurationFrame(root)
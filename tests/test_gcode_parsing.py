@@ -1,10 +1,112 @@
+import os
+import sys
+import io
+import shutil
+import contextlib
+import tempfile
 import unittest
 import decimal
 from decimal import Decimal
+from unittest import mock
 
 from gcodefollower import (
     changed_cmd,
+    get_cmd_meta,
+    GCodeFollower,
+    GCodeFollowerArgParser,
+    round_nearest_d,
+    show_fewest,
+    to_fixed,
 )
+from gcodefollower import temperature
+
+
+def parse_args(*args):
+    with mock.patch.object(sys, 'argv', ["TowerConfigurationCLI.py"]
+                           + list(args)):
+        return GCodeFollowerArgParser()
+
+
+def tower_lines():
+    '''
+    Get the lines of a synthetic tower: 300 layers 0.2mm apart, each
+    with one extruding move, after a header with temperature commands.
+    '''
+    lines = [
+        "; synthetic tower",
+        "M104 S200",
+        "M109 S200",
+        "M109 ; wait",
+        "M109",
+        "  M109 S200",
+        "G28",
+        "G92 E0",
+    ]
+    for n in range(1, 301):
+        lines += [
+            ";LAYER_CHANGE",
+            "G1 Z{:.3f} F600".format(n * 0.2),
+            "G1 X10 Y10 E{:.5f}".format(n * 0.5),
+        ]
+    lines += [
+        "M104 S0",
+        "G1 E-1 F2100 ; retract filament slightly",
+        "G28 X0",
+        "M84",
+    ]
+    return lines
+
+
+@contextlib.contextmanager
+def tower_dir(lines, newline="\n"):
+    '''
+    Work in a temporary directory (since settings are saved to the
+    working directory) containing the lines as tower.gcode, with the
+    output of GCodeFollower hidden.
+    '''
+    old_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            with open("tower.gcode", 'w', newline="") as outs:
+                outs.write(newline.join(lines) + newline)
+            with contextlib.redirect_stdout(io.StringIO()), \
+                    contextlib.redirect_stderr(io.StringIO()):
+                yield
+        finally:
+            os.chdir(old_dir)
+
+
+def checked_tower(min_temperature=190, max_temperature=210, step=None):
+    '''
+    Get a GCodeFollower for tower.gcode (See tower_dir) after
+    checkSettings.
+    '''
+    gcode = GCodeFollower(echo_callback=lambda msg: None,
+                          enable_ui_callback=lambda on: None)
+    gcode.setRangeVar('temperature', 0, min_temperature)
+    gcode.setRangeVar('temperature', 1, max_temperature)
+    if step is not None:
+        gcode.setVar('temperature_step', step)
+    gcode.setVar('template_gcode_path', "tower.gcode")
+    ok, err = gcode.checkSettings()
+    if not ok:
+        raise RuntimeError(err)
+    return gcode
+
+
+def generate_tower(lines, newline="\n"):
+    '''
+    Run generateTower from 190 to 210 on the lines (See tower_dir).
+
+    Returns: the lines of the resulting gcode.
+    '''
+    with tower_dir(lines, newline=newline):
+        gcode = checked_tower()
+        if not gcode.generateTower():
+            raise RuntimeError("generateTower failed.")
+        with open("210-190_tower.gcode", newline="") as ins:
+            return ins.read().split("\n")[:-1]
 
 
 class Testing(unittest.TestCase):
@@ -17,6 +119,178 @@ class Testing(unittest.TestCase):
         new = changed_cmd(old, 'Z', .4)
         self.assertEqual(new, expected)
 
+    def test_get_cmd_meta(self):
+        self.assertEqual(
+            get_cmd_meta("G1 X110 E45 F500.0\n"),
+            [['G', '1'], ['X', '110'], ['E', '45'], ['F', '500.0']]
+        )
+        self.assertEqual(
+            get_cmd_meta("\tG1  X5\t\tZ ; home Z"),
+            [['G', '1'], ['X', '5'], ['Z']]
+        )
+        self.assertEqual(
+            get_cmd_meta("G1" + " \t" * 40 + "Y7" + " " * 80 + "E1"),
+            [['G', '1'], ['Y', '7'], ['E', '1']]
+        )
+        self.assertEqual(
+            get_cmd_meta("M117 Some  message ; comment"),
+            [['M', '117'], ['', 'Some message']]
+        )
+        self.assertIsNone(get_cmd_meta(""))
+        self.assertIsNone(get_cmd_meta("; comment"))
+        self.assertIsNone(get_cmd_meta("  /G1 X5 ; block delete"))
+
+    def test_arg_parser(self):
+        params = parse_args("190", "210")
+        self.assertEqual(params.temperatures, ["190", "210"])
+        self.assertEqual(params.template_gcode_paths, [])
+        self.assertIsNone(params.template_gcode_path)
+
+        params = parse_args("tower.gcode", "190", "210")
+        self.assertEqual(params.temperatures, ["190", "210"])
+        self.assertEqual(params.template_gcode_paths, ["tower.gcode"])
+        self.assertEqual(params.template_gcode_path, "tower.gcode")
+
+        params = parse_args("a.gcode", "b.gcode", "c.gcode", "190", "210")
+        self.assertEqual(params.temperatures, ["190", "210"])
+        self.assertEqual(params.template_gcode_paths,
+                         ["a.gcode", "b.gcode", "c.gcode"])
+        self.assertEqual(params.template_gcode_path, "a.gcode")
+
+        params = parse_args("tower.gcode")
+        # ^ only a path, no temperatures
+        self.assertIsNone(params.temperatures)
+        self.assertEqual(params.template_gcode_paths, ["tower.gcode"])
+
+        params = parse_args("--help")
+        self.assertTrue(params.help)
+        self.assertIsNone(params.temperatures)
+        self.assertRaises(ValueError, parse_args, "--bogus")
+
+    def test_temperature_command_matching(self):
+        result = generate_tower(tower_lines())
+        self.assertEqual(result[:6], [
+            "; synthetic tower",
+            "M104 S200",
+            "M109 S210",
+            "M109 S210",
+            # ^ The command is changed if a space follows it...
+            "M109",
+            "  M109 S200",
+            # ^ ...but not if nothing follows it or it is indented.
+        ])
+
+    def test_subcode(self):
+        lines = tower_lines()
+        lines.insert(lines.index("G92 E0") + 1, "G92.1")
+        result = generate_tower(lines)
+        self.assertIn("G92.1", result)
+        # ^ passed through (not parsed as code 92)
+        self.assertEqual(len(result), len(generate_tower(tower_lines())) + 1)
+
+        lines = tower_lines()
+        lines.insert(lines.index("G92 E0") + 1, "GX1")
+        with self.assertRaises(ValueError) as caught:
+            generate_tower(lines)
+        self.assertIsNone(caught.exception.__context__)
+        # ^ not raised while handling the int() error
+
+    def test_round_nearest_d(self):
+        self.assertEqual(round_nearest_d(2.675, 2), Decimal("2.68"))
+        # ^ Decimal(2.675) is 2.67499999... so repr must be used.
+        self.assertEqual(round_nearest_d(1.005, 2), Decimal("1.01"))
+        self.assertEqual(round_nearest_d(Decimal("0.125"), 2),
+                         Decimal("0.13"))
+        self.assertEqual(round_nearest_d(2.5), 3)
+        self.assertRaises(TypeError, round_nearest_d, 1.5, 1.0)
+
+    def test_show_fewest(self):
+        self.assertEqual(show_fewest(2100.0), "2100")
+        self.assertEqual(show_fewest(100), "100")
+        self.assertEqual(show_fewest(0.0), "0")
+        self.assertEqual(show_fewest(-3.0), "-3")
+        self.assertEqual(show_fewest(Decimal("52.800")), "52.8")
+        self.assertEqual(temperature.stat_str(48478.50983000006),
+                         "48478.50983")
+        self.assertEqual(temperature.stat_str(True), "True")
+
+    def test_to_fixed(self):
+        self.assertEqual(to_fixed(2.2) - to_fixed(1.0), to_fixed(1.2))
+        # ^ unlike 2.2 - 1.0 (1.2000000000000002)
+        self.assertEqual(to_fixed(Decimal("0.2")), 200000)
+        self.assertEqual(to_fixed(0.2), 200000)
+        self.assertEqual(to_fixed(3), 3000000)
+
+    def test_check_settings(self):
+        with tower_dir(tower_lines()):
+            gcode = checked_tower()
+            self.assertEqual(
+                gcode.heights,
+                [Decimal(h) for h in ("0.000", "12.8", "22.8", "32.8",
+                                      "42.8", "52.8", "62.8", "72.8",
+                                      "82.8", "92.8")]
+            )
+            # ^ special_heights[0] then level_height for the rest
+            self.assertEqual(gcode.temperatures, [210, 205, 200, 195, 190])
+            self.assertEqual(checked_tower(step=10).temperatures,
+                             [210, 200, 190])
+            self.assertEqual(checked_tower(180, 250).temperatures,
+                             list(range(250, 200, -5)))
+            # ^ no more temperatures than levels
+            self.assertEqual(checked_tower(200, 200).temperatures, [200])
+            self.assertRaises(ValueError, checked_tower, 210, 190)
+            # ^ The minimum must not be more than the maximum.
+
+    def test_generate_tower(self):
+        lines = tower_lines()
+        result = generate_tower(lines)
+        self.assertEqual(result, generate_tower(lines, newline="\r\n"))
+        # ^ The output always uses "\n" (and is otherwise the same).
+        levels = [
+            ("G1 Z12.800 F600", "M109 S205.00", 199),
+            ("G1 Z22.800 F600", "M109 S200.00", 350),
+            ("G1 Z32.800 F600", "M109 S195.00", 501),
+            ("G1 Z42.800 F600", "M109 S190.00", 652),
+        ]
+        for move, temperature_line, index in levels:
+            self.assertEqual(result[index - 1:index + 1],
+                             [move, temperature_line])
+        self.assertEqual(
+            [line for line in result if line.startswith("M109 S")],
+            ["M109 S210", "M109 S210"]
+            + [level[1] for level in levels]
+        )
+        stop = result.index("G1 Z52.800 F600")
+        # ^ where the last level ends (building stops)
+        self.assertEqual(
+            [line for line in result[stop + 1:]
+             if line != ";LAYER_CHANGE"],
+            ["; GCodeFollower says: stop_building (additional"
+             " build-related codes that were below will be excluded)",
+             "M104 S0", "G1 E-1 F2100 ; retract filament slightly",
+             "G28 X0", "M84"]
+        )
+        # ^ Moves above the tower are dropped, but the end gcode is kept.
+
+    def test_main_with_bad_files(self):
+        lines = tower_lines()
+        expected = generate_tower(lines)
+        for names in (["missing.gcode", "bad.gcode", "a.gcode"],
+                      ["a.gcode", "bad.gcode", "missing.gcode"]):
+            with tower_dir(lines):
+                shutil.copy("tower.gcode", "a.gcode")
+                with open("bad.gcode", 'w') as outs:
+                    outs.write("G28\nGX1\nG1 Z0.2\n")
+                    # ^ makes the worker raise ValueError
+                argv = ["TowerConfigurationCLI.py"] + names + ["190", "210"]
+                with mock.patch.object(sys, 'argv', argv):
+                    code = temperature.main()
+                self.assertNotEqual(code, 0)
+                with open("210-190_a.gcode") as ins:
+                    self.assertEqual(ins.read().split("\n")[:-1], expected)
+                # ^ generated regardless of where the bad files are
+                self.assertTrue(os.path.isfile("settings.json"))
+
 
 if __name__ == '__main__':
     unittest.main()